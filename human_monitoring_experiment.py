@@ -9,9 +9,14 @@ from utils import Logger, GridworldVisualizer, GridworldValueVisualizer, AgentVi
 from world_config_20x20 import *
 # from world_config_6x6 import *
 import random
-import copy
 import os
 import sys
+from multiprocessing import Pool
+
+try:
+    import numba
+except ImportError:
+    numba = None
 
 
 def createTasks(stateSpace, num_task_types):
@@ -20,11 +25,11 @@ def createTasks(stateSpace, num_task_types):
 
     tasks = Tasks(stateSpace, num_task_types)
 
-    for i in range(NUM_TASKS):
-        task_num = np.random.randint(0, NUM_TASK_TYPES)
-        state = random.choice([s for s in stateSpace])
-        while tasks.get(state) is not None:
-            state = random.choice([s for s in stateSpace])
+    # Pick distinct states for the tasks, and a random type for each task
+    states = random.sample(list(stateSpace), NUM_TASKS)
+    task_nums = np.random.randint(0, NUM_TASK_TYPES, size=NUM_TASKS)
+
+    for state, task_num in zip(states, task_nums):
         tasks.add(state, task_num)
 
     return tasks
@@ -50,7 +55,13 @@ class TaskWorld:
             self.world.addTerminalState(task)
 
 
-def run(log_path, visualize):
+def run(log_path, visualize, seed=None):
+    # Seed the random number generators, so that runs are reproducible and
+    # independent of each other
+    if seed is not None:
+        np.random.seed(seed)
+        random.seed(seed)
+
     #### Create the environment #####
     world = GraphWorld((WIDTH, HEIGHT), 1, TransitionClass=SparseTransition)
     taskWorld = TaskWorld(world)
@@ -133,20 +144,23 @@ def run(log_path, visualize):
                            'num_task_types': NUM_TASK_TYPES,
                            'beta': BETA,
                            'discount': DISCOUNT,
-                           'blocked': blocked})
+                           'blocked': blocked},
+                 num_steps=NUM_STEPS)
 
     # Get the world state
     state = world.current_state
     trajectory = []
+    world_states = tuple(world.stateSpace)
     new_intent_time = MIN_NUMBER_STEPS_NEW_INTENT
 
     for t in range(NUM_STEPS):
         # Update the logger time
         log.setTime(t)
 
-        # Update the reward parameter
-
-        reward.setParameters(rewardParameters[t])
+        # Update the reward parameter, if it has changed, so the reward is only
+        # recalculated when needed
+        if not np.array_equal(reward.parameters, rewardParameters[t]):
+            reward.setParameters(rewardParameters[t])
         if visualize:
             rewardParamVisualizer.add(t, rewardParameters[t])
 
@@ -156,8 +170,8 @@ def run(log_path, visualize):
         # Recalculate the policy
         policy = solver.solve()
 
-        log.log('V', solver.V.copy())
-        log.log('Q', solver.Q.copy())
+        log.log('V', solver.V)
+        log.log('Q', solver.Q)
 
         # Determine the action
         action = policy.selectAction(state)
@@ -185,16 +199,17 @@ def run(log_path, visualize):
         # Check if a task has been done
         if tasks.get(state) is not None:
             onlineIRL.observe(trajectory)
-            prev_trajectory = copy.deepcopy(trajectory)
+            prev_trajectory = trajectory.copy()
             trajectory = []
             updateIRL = True
 
             tasks.remove(state)
 
-            # Add a random task somewhere there isn't one
+            # Add a random task somewhere there isn't one.  Tasks only cover a
+            # small fraction of the states, so only a few draws are expected
             task_state = state
             while task_state == state or tasks.get(task_state) is not None:
-                task_state = random.choice([s for s in world.stateSpace])
+                task_state = random.choice(world_states)
             task_num = np.random.randint(0, NUM_TASK_TYPES)
             for x in range(NUM_TASK_TYPES):
                 if tasks.count(x) == 0:
@@ -206,19 +221,19 @@ def run(log_path, visualize):
 
         if len(trajectory) >= MAX_IRL_STEPS:
             onlineIRL.observe(trajectory)
+            prev_trajectory = trajectory.copy()
             trajectory = []
-            prev_trajectory = copy.deepcopy(trajectory)
             updateIRL = True
 
         if updateIRL:
-            log.log('reward_pseudoestimate', onlineIRL.pseudoestimate.copy())
-            log.log('reward_pseudovariance', onlineIRL.pseudovariance.copy())
-            log.log('reward_estimate_update', onlineIRL.meanReward.copy())
-            log.log('reward_variance_update', onlineIRL.varReward.copy())
-            log.log('onlineIRL_mu', onlineIRL.mu.copy())
-            log.log('onlineIRL_nu', onlineIRL.nu.copy())
-            log.log('onlineIRL_alpha', onlineIRL.alpha.copy())
-            log.log('onlineIRL_beta', onlineIRL.beta.copy())
+            log.log('reward_pseudoestimate', onlineIRL.pseudoestimate)
+            log.log('reward_pseudovariance', onlineIRL.pseudovariance)
+            log.log('reward_estimate_update', onlineIRL.meanReward)
+            log.log('reward_variance_update', onlineIRL.varReward)
+            log.log('onlineIRL_mu', onlineIRL.mu)
+            log.log('onlineIRL_nu', onlineIRL.nu)
+            log.log('onlineIRL_alpha', onlineIRL.alpha)
+            log.log('onlineIRL_beta', onlineIRL.beta)
             log.log('onlineIRL_KL', onlineIRL.divergence)
 
             onlineIrlReward.setParameters(onlineIRL.meanReward)
@@ -226,11 +241,11 @@ def run(log_path, visualize):
             onlineIrlPolicy = onlineIrlSolver.solve()
 
             log.log('psuedo_Likelihood', irlPolicy.likelihood(prev_trajectory))
-            log.log('pseudo_V', irlSolver.V.copy())
-            log.log('pseudo_Q', irlSolver.Q.copy())
+            log.log('pseudo_V', irlSolver.V)
+            log.log('pseudo_Q', irlSolver.Q)
             log.log('onlineIRL_likelihood', onlineIrlPolicy.likelihood(prev_trajectory))
-            log.log('onlineIRL_V', onlineIrlSolver.V.copy())
-            log.log('onlineIrl_Q', onlineIrlSolver.Q.copy())
+            log.log('onlineIRL_V', onlineIrlSolver.V)
+            log.log('onlineIrl_Q', onlineIrlSolver.Q)
 
             if visualize:
                 rewardEstimateVisualizer.add(t, onlineIRL.meanReward, variance=onlineIRL.varReward)
@@ -240,7 +255,7 @@ def run(log_path, visualize):
             if onlineIRL.divergence >= NEW_INTENT_THRESHOLD and t >= new_intent_time:
                 new_intent_time = t + MIN_NUMBER_STEPS_NEW_INTENT
                 print("New intent at time %d" % t)
-                log.log('final_intent_reward_parameters', onlineIRL.meanReward.copy())
+                log.log('final_intent_reward_parameters', onlineIRL.meanReward)
                 onlineIRL.init_hyperparameters()
                 log.log('new_intent', True)
 
@@ -252,6 +267,16 @@ def run(log_path, visualize):
 #		vis.close()
 
 
+def initWorker():
+    """
+    Limit each worker process to a single Numba thread, as the runs are
+    already performed in parallel across processes
+    """
+
+    if numba is not None:
+        numba.set_num_threads(1)
+
+
 if __name__ == '__main__':
 
     path = sys.argv[1]
@@ -265,6 +290,18 @@ if __name__ == '__main__':
     if not os.path.exists(path):
         os.makedirs(path)
     path_template = path + "run_%d.pkl"
-    for run_num in range(start_num, end_num):
-        print("Experiment %d" % run_num)
-        run(path_template % run_num, visualize)
\ No newline at end of file
+    # Runs are independent, so run them in parallel.  Visualization uses
+    # matplotlib, which can't be shared across processes, so visualized runs
+    # are performed sequentially
+    if visualize:
+        for run_num in range(start_num, end_num):
+            print("Experiment %d" % run_num)
+            run(path_template % run_num, visualize, run_num)
+    else:
+        with Pool(processes=os.cpu_count(), initializer=initWorker) as pool:
+            results = [(run_num, pool.apply_async(run, (path_template % run_num, False, run_num)))
+                       for run_num in range(start_num, end_num)]
+
+            for run_num, result in results:
+                result.get()
+                print("Experiment %d" % run_num)
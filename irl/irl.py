@@ -158,7 +158,7 @@ class BellmanGradientIRL:
 
 		# Get the gradient of the reward, if necessary
 		if rewardGradient is None:
-			rewardGradient = np.array(self.reward.gradient().todense())
+			rewardGradient = np.array(self.reward.gradient())
 
 		# Get the transition as an array
 		if transition is None:
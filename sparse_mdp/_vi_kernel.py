@@ -0,0 +1,52 @@
+## _vi_kernel.py
+##
+## A compiled Bellman backup for SparseValueIteration.  Numba is optional; if
+## it isn't available, bellman_sweep is None and solvers fall back to sparse
+## matrix-vector products.
+
+try:
+	from numba import njit, prange
+except ImportError:
+	njit = None
+
+
+if njit is not None:
+
+	@njit(parallel=True, fastmath=True, cache=True)
+	def bellman_sweep(V_in, V_out, Q_out, R, terminal, self_loop, P_indptr, P_indices, P_data, gamma, S, A):
+		"""
+		Perform a single Bellman backup, V <- max_a (R + gamma * P V), writing the
+		results into V_out and Q_out.
+
+		V_in      - (state) array of current state values
+		V_out     - (state) array to write the updated state values to
+		Q_out     - (state x action) array to write the updated Q values to
+		R         - (state x action) array of immediate rewards
+		terminal  - (state) array indicating which states are terminal
+		self_loop - (state*action) boolean array marking rows pruned from the
+		            transition matrix, which deterministically remain in state s
+		P_indptr, P_indices, P_data - CSR arrays of the stacked (state*action x
+		            next_state) transition matrix
+		gamma     - discount factor
+		S, A      - number of states and actions
+		"""
+
+		for s in prange(S):
+			for a in range(A):
+				row = s*A + a
+
+				# Expected value of the next state
+				if self_loop[row]:
+					nextValue = V_in[s]
+				else:
+					nextValue = 0.0
+					for k in range(P_indptr[row], P_indptr[row+1]):
+						nextValue += P_data[k] * V_in[P_indices[k]]
+
+				Q_out[s,a] = R[s,a] + (1.0 - terminal[s]) * gamma * nextValue
+
+				if a == 0 or Q_out[s,a] > V_out[s]:
+					V_out[s] = Q_out[s,a]
+
+else:
+	bellman_sweep = None
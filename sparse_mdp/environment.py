@@ -1,9 +1,39 @@
 import numpy as np
+from scipy.sparse import coo_matrix
 
 from .spaces import *
 from .transition import *
 
-from itertools import product
+
+def _grid_next_states(shape, states, offsets):
+    """
+    Calculate the index of the next state for every (state, offset) pair in a
+    2D grid.  Offsets which move off the grid, or into a cell which isn't in
+    the list of states (e.g., a blocked cell), leave the agent in place.
+
+    shape   - tuple defining the size of the world: (width, height)
+    states  - sequence of the (x,y) position of each state
+    offsets - sequence of (dx,dy) displacements
+
+    returns - a (num_states x num_offsets) array of next state indices
+    """
+
+    states = np.asarray(states, dtype=int).reshape((-1, 2))
+    offsets = np.asarray(offsets, dtype=int).reshape((-1, 2))
+    stateIndices = np.arange(len(states))
+
+    # Map each grid cell to its state index, with -1 for cells without a state
+    index = np.full(shape, -1, dtype=int)
+    index[states[:, 0], states[:, 1]] = stateIndices
+
+    x = states[:, 0, None] + offsets[None, :, 0]
+    y = states[:, 1, None] + offsets[None, :, 1]
+
+    valid = (x >= 0) & (x < shape[0]) & (y >= 0) & (y < shape[1])
+    nextStates = index[np.clip(x, 0, shape[0] - 1), np.clip(y, 0, shape[1] - 1)]
+    valid &= nextStates >= 0
+
+    return np.where(valid, nextStates, stateIndices[:, None])
 
 
 class AbstractEnvironment:
@@ -194,8 +224,7 @@ class GraphWorld(DiscreteEnvironment):
                     self.blocked_cells.add((x, y))
 
         # Remove blocked cells from the state space
-        for x, y, in self.blocked_cells:
-            states.remove((x, y))
+        states = [state for state in states if state not in self.blocked_cells]
 
         # Call the DiscreteEnvironment initializer, passing the states and
         # actions wrapped as DiscreteSpaces.  This initializes the stateSpace,
@@ -207,25 +236,22 @@ class GraphWorld(DiscreteEnvironment):
                                      TransitionClass=TransitionClass)
 
         # Populate the transition functions
-        for state, action in [(s, a) for s in self.stateSpace for a in self.actionSpace]:
-            self.__set_transitions(state, action)
+        self.__set_transitions()
 
-    def __set_transitions(self, state, action):
+    def __set_transitions(self):
         """
-        Creates the entries in the transition function for the given state and action
+        Creates the entries in the transition function for all states and actions
         """
-        # Extract x and y to calculate the position of the next state
-        x, y = state
-        x += action[0]
-        y += action[1]
 
-        # Check if the new x,y maps to a valid state.  If not, next_state should
-        # simply be the original state
-        if (x, y) not in self.stateSpace or (x, y) in self.blocked_cells:
-            x, y = state
+        # Actions are (dx,dy) offsets.  Moves to invalid or blocked cells leave
+        # the agent in the original state
+        nextStates = _grid_next_states(self.shape, list(self.stateSpace), list(self.actionSpace))
+        numStates, numActions = nextStates.shape
 
         # Populate the transition function
-        self.transition[self.enumerate(state, action, (x, y))] = 1.0
+        self.transition.set(np.repeat(np.arange(numStates), numActions),
+                            np.tile(np.arange(numActions), numStates),
+                            nextStates.flatten(), 1.0)
 
     def __str__(self):
         """
@@ -279,8 +305,7 @@ class Gridworld(DiscreteEnvironment):
                     self.blocked_cells.add((x, y))
 
         # Remove blocked cells from the state space
-        for x, y, in self.blocked_cells:
-            states.remove((x, y))
+        states = [state for state in states if state not in self.blocked_cells]
 
         # Call the DiscreteEnvironment initializer, passing the states and
         # actions wrapped as DiscreteSpaces.  This initializes the stateSpace,
@@ -292,28 +317,24 @@ class Gridworld(DiscreteEnvironment):
                                      TransitionClass=TransitionClass)
 
         # Populate the transition functions
-        for state, action in [(s, a) for s in self.stateSpace for a in self.actionSpace]:
-            self.__set_transitions(state, action)
+        self.__set_transitions()
 
-    def __set_transitions(self, state, action):
+    def __set_transitions(self):
         """
-        Creates the entries in the transition function for the given state and action
+        Creates the entries in the transition function for all states and actions
         """
 
-        # Extract x and y to calculate the position of the next state
-        x, y = state
-
-        # Update x and y based on actions
-        x += {'left': -1, 'right': 1}.get(action, 0)
-        y += {'up': -1, 'down': 1}.get(action, 0)
-
-        # Check if the new x,y maps to a valid state.  If not, next_state should
-        # simply be the original state
-        if (x, y) not in self.stateSpace or (x, y) in self.blocked_cells:
-            x, y = state
+        # Convert actions to (dx,dy) offsets.  Moves to invalid or blocked cells
+        # leave the agent in the original state
+        offsets = [({'left': -1, 'right': 1}.get(action, 0), {'up': -1, 'down': 1}.get(action, 0))
+                   for action in self.actionSpace]
+        nextStates = _grid_next_states(self.shape, list(self.stateSpace), offsets)
+        numStates, numActions = nextStates.shape
 
         # Populate the transition function
-        self.transition[self.enumerate(state, action, (x, y))] = 1.0
+        self.transition.set(np.repeat(np.arange(numStates), numActions),
+                            np.tile(np.arange(numActions), numStates),
+                            nextStates.flatten(), 1.0)
 
     def __str__(self):
         """
@@ -355,36 +376,41 @@ class NoisyGridworld(Gridworld):
         self.noise = noise
 
         # Upldate the transition function to include random noise
-        for state, action in [(s, a) for s in self.stateSpace for a in self.actionSpace]:
-            self.__update_transitions(state, action, noise)
+        self.__update_transitions(noise)
 
-    def __update_transitions(self, state, action, noise):
+    def __update_transitions(self, noise):
         """
         Redistribute the probability distribution over next states to include
         random motion to available neighboring states, as well as possibly
         staying in the same cell
         """
 
-        valid_next_states = set()
+        numStates = len(self.stateSpace)
+        numActions = len(self.actionSpace)
+
+        # Calculate the neighboring states of each state.  Invalid neighbors map
+        # back onto the state itself, so only count staying in place (the first
+        # offset) and neighbors which differ from the state as valid
+        neighbors = _grid_next_states(self.shape, list(self.stateSpace),
+                                      [(0, 0), (0, -1), (0, 1), (-1, 0), (1, 0)])
+        valid = neighbors != np.arange(numStates)[:, None]
+        valid[:, 0] = True
 
-        # Calculate valid next states
-        for dx, dy in [(0, 0), (0, -1), (0, 1), (-1, 0), (1, 0)]:
-            # What is the next state (x and y values)?
-            x = state[0] + dx
-            y = state[1] + dy
+        # Each valid neighbor receives noise / valid_states of the probability,
+        # regardless of the action performed
+        states, neighborIdx = np.nonzero(valid)
+        rows = (states[:, None] * numActions + np.arange(numActions)[None, :]).flatten()
+        cols = np.repeat(neighbors[states, neighborIdx], numActions)
+        probs = np.repeat(noise / np.sum(valid, axis=1)[states], numActions)
 
-            # Decrease the probability of transitioning into next_state by 1-noise
-            if (x, y) in self.stateSpace:
-                self.transition[self.enumerate(state, action, (x, y))] *= (1 - noise)
+        noiseMatrix = coo_matrix((probs, (rows, cols)), shape=(numStates * numActions, numStates))
 
-            # Determine if the next state is a valid transition
-            if (x, y) in self.stateSpace and (x, y) not in self.blocked_cells:
-                valid_next_states.add((x, y))
+        # Decrease the probability of the original transitions by 1-noise, and
+        # add the random motion
+        transition = ((1 - noise) * self.transition.asMatrix() + noiseMatrix).tocoo()
 
-        # Increase the chance of transitioning into each valid next state by
-        # noise / valid_states
-        for nextState in valid_next_states:
-            self.transition[self.enumerate(state, action, nextState)] += noise / len(valid_next_states)
+        self.transition.set(transition.row // numActions, transition.row % numActions,
+                            transition.col, transition.data)
 
     def __str__(self):
         """
@@ -399,8 +425,9 @@ class Taskworld(DiscreteEnvironment):
     """
     A Taskworld environment is similar to a Gridworld environment, in that it
     defines a 2D grid world.  States are symbolically represented as the (x,y)
-    position of an agent in the world, augmented by a binary list of specific
-    tasks to be completed.  Actions consist of 'up', 'down', 'left', 'right',
+    position of an agent in the world, augmented by an integer bitmask of specific
+    tasks which have been completed.  Bit i of the mask is set once the task at
+    taskLocations[i] is complete.  Actions consist of 'up', 'down', 'left', 'right',
     'operate', and optionally 'stay'.  Grid cells can be blocked.
 
     Tasks are associated with specific grid cells, with one task per grid cell.
@@ -414,7 +441,7 @@ class Taskworld(DiscreteEnvironment):
                  TransitionClass=SparseTransition):
         """
         Create a taskworld with the given size and number of tasks.  States are
-        defined as the cross-product of (x,y) corrdinates and a binary vector of
+        defined as the cross-product of (x,y) corrdinates and a bitmask of
         task completion.  Actions are in the set ['up','down','left','right',
         'operate','stay']
 
@@ -441,9 +468,9 @@ class Taskworld(DiscreteEnvironment):
         self.numTasks = len(taskLocations)
         self.taskComplete = [False] * self.numTasks
 
-        # Task completion vectors are defined as binary tuples indicating which
+        # Task completion is defined as an integer bitmask indicating which
         # tasks are complete.
-        taskSpace = list(product([False, True], repeat=self.numTasks))
+        taskSpace = range(1 << self.numTasks)
 
         self.locations = [(x, y) for x in range(self.shape[0]) for y in range(self.shape[1])]
 
@@ -456,12 +483,12 @@ class Taskworld(DiscreteEnvironment):
                 if blocked[x, y] != 0:
                     self.blocked_cells.add((x, y))  # Add this as a blocked cell
 
-        for x, y in self.blocked_cells:
-            self.locations.remove((x, y))  # Remove from possible locations
+        # Remove from possible locations
+        self.locations = [location for location in self.locations if location not in self.blocked_cells]
 
         # States are defined as all possible combinations of locations and task
         # completion states
-        states = [(location, task) for location in self.locations for task in taskSpace]
+        states = [(location, taskMask) for location in self.locations for taskMask in taskSpace]
 
         actions = ['up', 'right', 'down', 'left', 'operate']
         if can_stay:
@@ -487,7 +514,7 @@ class Taskworld(DiscreteEnvironment):
 
         # Extract location to calculate the position of the next state, and task
         # completion to calculate the effect of operate actions
-        location, task = state
+        location, taskMask = state
         x, y = location
 
         # Update x and y based on actions
@@ -496,19 +523,17 @@ class Taskworld(DiscreteEnvironment):
 
         # Check if the new x,y maps to a valid state.  If not, next_state should
         # simply be the original state
-        if (x, y) not in self.locations or (x, y) in self.blocked_cells:
+        if ((x, y), taskMask) not in self.stateSpace:
             x, y = location
 
         # See what to do if an operation is performed
         if action == 'operate' and location in self.taskLocations:
-            # Set the completion of the task at this location to True
-            task = list(task)
+            # Set the completion bit of the task at this location
             taskIndex = self.taskLocations.index(location)
-            task[taskIndex] = True
-            task = tuple(task)
+            taskMask |= 1 << taskIndex
 
         # Populate the transition function
-        self.transition.set(self.stateSpace(state), self.actionSpace(action), self.stateSpace(((x, y), task)), 1.0)
+        self.transition.set(self.stateSpace(state), self.actionSpace(action), self.stateSpace(((x, y), taskMask)), 1.0)
 
     def __str__(self):
         """
@@ -334,12 +334,14 @@ class DiscreteStochasticPolicy(AbstractPolicy):
 		return - the log-likelihood of the trajectory under the policy
 		"""
 
-		likelihood = 0.0
+		if len(trajectory) == 0:
+			return 0.0
 
-		for state, action in trajectory:
-			likelihood += np.log(max(self[state,action], eps))
+		# Look up the probability of every state / action pair at once
+		states = [self.stateSpace(state) for state, _ in trajectory]
+		actions = [self.actionSpace(action) for _, action in trajectory]
 
-		return likelihood
+		return np.sum(np.log(np.maximum(self.policy[states, actions], eps)))
 
 
 	def clone(self):
@@ -92,6 +92,9 @@ class Tasks:
 
 		self.tasks = {}
 
+		# Cached (state, task) tuple returned by toList, cleared on modification
+		self.__list = None
+
 		self.observers = []
 
 
@@ -110,6 +113,7 @@ class Tasks:
 			print("ERROR: %s doesn't exist in state space!" % str(state))
 
 		self.tasks[state] = task
+		self.__list = None
 		for observer in self.observers:
 			observer.updateTasks(self)
 
@@ -120,6 +124,7 @@ class Tasks:
 
 		if state in self.tasks:
 			del self.tasks[state]
+			self.__list = None
 			for observer in self.observers:
 				observer.updateTasks(self)
 
@@ -138,10 +143,15 @@ class Tasks:
 
 	def toList(self):
 		"""
-		Return a list of tuples of (state, task)
+		Return a tuple of (state, task) pairs.  The same tuple object is returned
+		until a task is added or removed, so repeated calls (e.g., logging every
+		time step) don't allocate a new copy.
 		"""
 
-		return list(self.tasks.items())
+		if self.__list is None:
+			self.__list = tuple(self.tasks.items())
+
+		return self.__list
 
 
 
@@ -162,16 +172,21 @@ class SparseFeatureMap:
 			self.stateSpace = stateSpace
 			self.numFeatures = numFeatures
 
-			self.features = dok_matrix((len(stateSpace), numFeatures), dtype=np.int8)
+			# Features are stored as a dense (state x feature) array, which is
+			# shared by all rewards using this feature map, so that rewards can be
+			# calculated with a single matrix-vector product
+			self.features = np.zeros((len(stateSpace), numFeatures), dtype=np.double)
 			self.listeners = []
 
 
-	 def __informListeners(self):
+	 def __informListeners(self, stateNumber=None):
 			"""
+			Inform listeners that features have changed.  If only a single state's
+			features changed, stateNumber is the index of that state.
 			"""
 
 			for listener in self.listeners:
-				 listener.notify(self)
+				 listener.notify(self, stateNumber)
 
 
 	 def __call__(self, state):
@@ -199,16 +214,31 @@ class SparseFeatureMap:
 
 	 def updateTasks(self, tasks):
 	 	"""
+	 	Update the task features to match the tasks.  Listeners are informed of
+	 	the changed state if only a single state's features changed (e.g., a
+	 	task was added or removed), so rewards only need to update that state.
 	 	"""
 
-	 	for state in self.stateSpace:
-	 		if tasks.get(state) is None:
-	 			for feature in range(tasks.numTasks):
-	 				self.features[self.stateSpace(state), feature] = 0
-	 		else:
-	 			self.features[self.stateSpace(state), tasks.get(state)] = 1
+	 	previousFeatures = self.features[:, :tasks.numTasks].copy()
+
+	 	taskList = tasks.toList()
+	 	taskStates = np.array([self.stateSpace(state) for state, _ in taskList], dtype=int)
+	 	taskNumbers = np.array([task for _, task in taskList], dtype=int)
+
+	 	# Clear the task features of states without a task, and set the feature
+	 	# of each state's task
+	 	noTask = np.ones((len(self.stateSpace),), dtype=bool)
+	 	noTask[taskStates] = False
 
-	 	self.__informListeners()
+	 	self.features[noTask, :tasks.numTasks] = 0
+	 	self.features[taskStates, taskNumbers] = 1
+
+	 	changedStates = np.flatnonzero(np.any(self.features[:, :tasks.numTasks] != previousFeatures, axis=1))
+
+	 	if len(changedStates) == 1:
+	 		self.__informListeners(changedStates[0])
+	 	elif len(changedStates) > 1:
+	 		self.__informListeners()
 
 
 
@@ -226,7 +256,7 @@ class SparseFeatureMap:
 
 			self.features[self.stateSpace(state), featureNumber] = 1
 
-			self.__informListeners()
+			self.__informListeners(self.stateSpace(state))
 
 
 	 def clearFeature(self, state, featureNumber):
@@ -235,11 +265,14 @@ class SparseFeatureMap:
 
 			self.features[self.stateSpace(state), featureNumber] = 0
 
-			self.__informListeners()
+			self.__informListeners(self.stateSpace(state))
 
 
 	 def asArray(self):
 			"""
+			Return the features as a dense (state x feature) numpy array.  The array
+			is the feature map's own storage, so it is shared by every reward using
+			the feature map and should not be modified directly.
 			"""
 
 			return self.features
@@ -258,8 +291,6 @@ class SparseFeatureMap:
 
 
 
-
-
 class SparseLinearParametricReward(AbstractReward):
 	 """
 	 A LinearParametericReward defines rewards for each (state,action,next_state) 
@@ -281,16 +312,21 @@ class SparseLinearParametricReward(AbstractReward):
 
 			self.parameters = parameters
 
-			self.reward = [dok_matrix((len(self.stateSpace), len(self.stateSpace))) for a in self.actionSpace]
+			# Rewards are stored as a (state x action) array; the per-action
+			# (state x nextState) matrices are only built when requested
+			self.stateActionReward = np.zeros((len(self.stateSpace), len(self.actionSpace)))
+			self.reward = None
 
 			self.stale = True
 
 
 	 def gradient(self):
 	 		"""
+	 		Return the gradient of the reward with respect to the parameters, i.e.,
+	 		the (state x feature) array of features
 	 		"""
 
-	 		return dok_matrix(self.featureMap.asArray(), dtype=np.float)
+	 		return self.featureMap.asArray()
 
 
 	 def setParameters(self, parameters):
@@ -302,11 +338,27 @@ class SparseLinearParametricReward(AbstractReward):
 			self.stale = True
 
 
-	 def notify(self, featureMap):
+	 def notify(self, featureMap, stateNumber=None):
 			"""
+			Called by the feature map when features change.  If only the features of
+			a single state changed, only that state's reward is recalculated.
 			"""
 
-			self.stale = True
+			if stateNumber is None or self.stale:
+				 self.stale = True
+			else:
+				 self.updateState(stateNumber)
+
+
+	 def updateState(self, stateNumber):
+			"""
+			Recalculate the reward of a single state, e.g., after its features have
+			changed.  The rest of the reward is assumed to be up to date.
+			"""
+
+			stateFeatures = self.featureMap.asArray()[stateNumber]
+			self.stateActionReward[stateNumber,:] = stateFeatures.dot(self.parameters)
+			self.reward = None
 
 
 	 def calculateReward(self):
@@ -314,10 +366,12 @@ class SparseLinearParametricReward(AbstractReward):
 			"""
 
 			stateFeatures = self.featureMap.asArray()
-			stateReward = csr_matrix(stateFeatures.dot(self.parameters))
-			stateReward = scipy.sparse.hstack([stateReward.T]*len(self.stateSpace))
+			stateReward = stateFeatures.dot(self.parameters)
 
-			self.reward = [stateReward for _ in self.actionSpace]
+			# The reward is not conditioned on action or next state, so simply
+			# broadcast the state reward across actions
+			self.stateActionReward = np.repeat(stateReward[:,None], len(self.actionSpace), axis=1)
+			self.reward = None
 
 			self.stale = False
 
@@ -333,7 +387,7 @@ class SparseLinearParametricReward(AbstractReward):
 			if self.stale:
 				 self.calculateReward()
 
-			return self.reward[self.actionSpace(action)][self.stateSpace(state),self.stateSpace(next_state)]
+			return self.asArray()[self.actionSpace(action)][self.stateSpace(state),self.stateSpace(next_state)]
 
 			
 	 def __getitem__(self, index):
@@ -343,10 +397,7 @@ class SparseLinearParametricReward(AbstractReward):
 			to numpy arrays
 			"""
 
-			if self.stale:
-				 self.calculateReward()
-
-			return self.reward[index[1]][index[0],index[2]]
+			return self.asArray()[index[1]][index[0],index[2]]
 
 
 	 def __iter__(self):
@@ -374,5 +425,23 @@ class SparseLinearParametricReward(AbstractReward):
 			if self.stale:
 				 self.calculateReward()
 
+			if self.reward is None:
+				 stateReward = csr_matrix(self.stateActionReward[:,0])
+				 stateReward = scipy.sparse.hstack([stateReward.T]*len(self.stateSpace))
+
+				 self.reward = [stateReward for _ in self.actionSpace]
+
 			return self.reward
 
+
+	 def asStateActionArray(self):
+			"""
+			Return a numpy array representing the immediate reward R(s,a), with
+			shape (state x action)
+			"""
+
+			if self.stale:
+				 self.calculateReward()
+
+			return self.stateActionReward
+
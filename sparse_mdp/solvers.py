@@ -1,8 +1,46 @@
 import numpy as np
 import scipy.sparse
 from scipy.sparse import csc_matrix, csr_matrix, coo_matrix, dok_matrix
+from scipy.special import logsumexp
 
 from .policy import *
+from ._vi_kernel import bellman_sweep
+
+
+def _prune_self_loops(transition, numActions):
+	"""
+	Remove the entries of state / action rows which deterministically leave the
+	state unchanged (e.g., staying in place, or moving into a wall or blocked
+	cell) from a stacked transition matrix.  The expected next state value of
+	these rows is simply the value of the state itself, so the rows don't need
+	to be part of the sparse matrix-vector product.
+
+	transition - (state*action x next_state) stacked CSR transition matrix
+	numActions - number of actions
+
+	returns - a CSR matrix of the same shape with the self-loop rows emptied,
+	          a boolean (state*action) array marking the self-loop rows, and
+	          arrays of the index and state of each self-loop row
+	"""
+
+	transition = csr_matrix(transition)
+	rowStates = np.arange(transition.shape[0]) // numActions
+	rowCounts = np.diff(transition.indptr)
+
+	# A row is a self-loop if its only entry is P(s,a,s) = 1
+	firstEntry = np.minimum(transition.indptr[:-1], max(transition.nnz - 1, 0))
+	selfLoop = (rowCounts == 1)
+	selfLoop[selfLoop] &= (transition.indices[firstEntry[selfLoop]] == rowStates[selfLoop]) & \
+	                      (transition.data[firstEntry[selfLoop]] == 1.0)
+
+	keep = np.repeat(~selfLoop, rowCounts)
+	indptr = np.concatenate(([0], np.cumsum(np.where(selfLoop, 0, rowCounts))))
+
+	pruned = csr_matrix((transition.data[keep], transition.indices[keep], indptr), shape=transition.shape)
+
+	selfLoopRows = np.flatnonzero(selfLoop)
+
+	return pruned, selfLoop, selfLoopRows, rowStates[selfLoopRows]
 
 
 class ILESolver:
@@ -98,31 +136,46 @@ class SparseValueIteration:
 			self.mdp = mdp
 			self.threshold = threshold
 
-			self.V = np.zeros((len(self.mdp.stateSpace,)))
-			self.Q = np.zeros((len(self.mdp.stateSpace), len(self.mdp.actionSpace)))
+			self.reset()
+
+			# Cache of the stacked transition matrix with self-loop rows pruned
+			self.__transition = None
+			self.__pruned = None
 
 			self.policyGenerator = policyGenerator
 
 			self.observers = []
 
 
-	 def step(self, terminal, transition=None, reward=None, Q0=None):
+	 def step(self, terminal, transition=None, reward=None, selfLoops=None):
 			"""
+			Perform a single Bellman backup, V <- max_a (R + gamma * P V)
+
+			terminal   - array indicating which states are terminal
+			transition - (state*action x next_state) stacked transition matrix
+			reward     - (state x action) array of immediate rewards
+			selfLoops  - (optional) tuple of the row indices and states of rows
+			             which were pruned from the transition matrix because they
+			             deterministically remain in the same state
 			"""
 
 			if transition is None:
-				 transition = [m.tocsr() for m in self.mdp.environment.transition.asArray()]
+				 transition = self.mdp.environment.transition.asMatrix()
 
 			if reward is None:
-				 reward = [m.tocsr() for m in self.mdp.reward.asArray()]
+				 reward = self.mdp.reward.asStateActionArray()
 
-			# Calculate the immediate reward for each state/action pair, if not provided
-#      if Q0 is None:
-#         Q0 = np.hstack([t.multiply(r).sum(axis=1) for t,r in zip(transition, reward)])
+			# Add the future reward of each state / action pair.  A single sparse
+			# matrix-vector product covers every state / action pair at once.
+			nextValue = transition.dot(self.V)
 
-			# Add the future reward of each state / action pair
-			nextQ = self.mdp.discount * np.vstack([t.dot(self.V) for t in transition]).T
-			Q = np.array(Q0 + (1.0 - terminal[:,None]) * nextQ)
+			# Pruned self-loop rows simply keep the value of the current state
+			if selfLoops is not None:
+				 selfLoopRows, selfLoopStates = selfLoops
+				 nextValue[selfLoopRows] = self.V[selfLoopStates]
+
+			nextQ = self.mdp.discount * nextValue.reshape(reward.shape)
+			Q = reward + (1.0 - terminal[:,None]) * nextQ
 
 			# Calculate the state value function
 			V = np.max(Q, axis=1)
@@ -134,25 +187,51 @@ class SparseValueIteration:
 	 	self.observers.append(observer)
 
 
+	 def reset(self):
+			"""
+			Discard the value function from previous calls to solve, so that the
+			next call starts from V = 0
+			"""
+
+			self.V = np.zeros((len(self.mdp.stateSpace,)))
+			self.Q = np.zeros((len(self.mdp.stateSpace), len(self.mdp.actionSpace)))
+
+
 	 def solve(self, update=True):
 			"""
+			Run value iteration until the state values converge.  Iteration is warm
+			started from the value function of the previous call, which is close
+			to the solution when the reward changes slowly between calls.  Call
+			reset() to start from V = 0 instead.
 			"""
 
-			# Create an array indicating which states are terminal      
+			# Create an array indicating which states are terminal
 			terminal = [self.mdp.environment.isTerminal(s) for s in self.mdp.stateSpace]
 			terminal = np.array(terminal).astype(np.double)
 
-			# Get the transition and reward function in csr format
-			transition = [m.tocsr() for m in self.mdp.environment.transition.asArray()]
-			reward = [m.tocsr() for m in self.mdp.reward.asArray()]
+			# Get the stacked transition matrix and the immediate reward of each
+			# state / action pair
+			transition = self.mdp.environment.transition.asMatrix()
+			reward = self.mdp.reward.asStateActionArray()
 
-			Q0 = np.hstack([(t.multiply(r)).sum(axis=1) for t,r in zip(transition, reward)])
+			# Prune state / action pairs which only loop back onto the same state
+			# from the transition matrix.  The pruned matrix is reused for as long
+			# as the environment's transition matrix is unchanged.
+			if transition is not self.__transition:
+				 self.__transition = transition
+				 self.__pruned = _prune_self_loops(transition, reward.shape[1])
+
+			transition, selfLoop, selfLoopRows, selfLoopStates = self.__pruned
+
+			# Use the compiled Bellman backup if Numba is available
+			if bellman_sweep is not None:
+				 self.V, self.Q = self.__compiledSolve(terminal, transition, reward, selfLoop)
 
 			# Loop until all state values are below threshold
-			done = False
+			done = bellman_sweep is not None
 
 			while not done:
-				 V, Q = self.step(terminal, transition, reward, Q0)
+				 V, Q = self.step(terminal, transition, reward, (selfLoopRows, selfLoopStates))
 
 				 done = np.all(np.abs(self.V - V) < self.threshold)
 
@@ -166,6 +245,33 @@ class SparseValueIteration:
 			return self.policyGenerator(self)
 
 
+	 def __compiledSolve(self, terminal, transition, reward, selfLoop):
+			"""
+			Iterate the compiled Bellman backup until all state values are below
+			threshold, swapping the input and output value buffers between sweeps.
+			"""
+
+			numStates, numActions = reward.shape
+			reward = np.ascontiguousarray(reward, dtype=np.double)
+
+			V_in = np.array(self.V, dtype=np.double)
+			V_out = np.empty_like(V_in)
+			Q = np.empty((numStates, numActions))
+
+			done = False
+
+			while not done:
+				 bellman_sweep(V_in, V_out, Q, reward, terminal, selfLoop,
+				               transition.indptr, transition.indices, transition.data,
+				               self.mdp.discount, numStates, numActions)
+
+				 done = np.all(np.abs(V_out - V_in) < self.threshold)
+
+				 V_in, V_out = V_out, V_in
+
+			return V_in, Q
+
+
 
 
 
@@ -197,8 +303,8 @@ class BoltzmannPolicyGenerator:
 
 			policy = DiscreteStochasticPolicy(solver.mdp.stateSpace, solver.mdp.actionSpace)
 
-			policy.policy = np.exp(self.beta*solver.Q)
-			Z = np.sum(policy.policy, axis=1)
-			policy.policy /= np.vstack([Z]*len(solver.mdp.actionSpace)).T
+			# Normalize in log space to avoid overflow for large beta*Q
+			logits = self.beta*solver.Q
+			policy.policy = np.exp(logits - logsumexp(logits, axis=1, keepdims=True))
 
 			return policy
@@ -50,22 +50,9 @@ class DiscreteSpace:
 				 d
 			"""
 
-			# (Re)set an index over the elements
-			self.__iter_idx = 0
-			return self
-
-
-	 def __next__(self):
-			"""
-			Get the next element.  See __iter__(self) docstring for details of method
-			"""
-
-			if self.__iter_idx < len(self.elements):
-				 element = self.elements[self.__iter_idx]
-				 self.__iter_idx += 1
-				 return element
-			else:
-				 raise StopIteration
+			# Iterate directly over the element list, rather than stepping through
+			# the elements with a Python-level __next__
+			return iter(self.elements)
 
 
 	 def __contains__(self, element):
@@ -81,7 +68,7 @@ class DiscreteSpace:
 				 False
 			"""
 
-			return element in self.elements
+			return element in self.element_map
 
 
 	 def __call__(self, element):
@@ -135,7 +135,17 @@ class DiscreteTransition(AbstractTransition):
 			"""
 
 			return self.__transition
-			
+
+
+	 def asMatrix(self):
+			"""
+			Return a sparse matrix of the transition function, with shape
+			(num_states*num_actions x num_states).  Row state*num_actions + action
+			contains the distribution over next states for the state / action pair.
+			"""
+
+			return csr_matrix(self.__transition.reshape((self.num_states*self.num_actions, self.num_states)))
+
 
 
 
@@ -176,13 +186,33 @@ class SparseTransition(AbstractTransition):
 		# matrices.  List is indexed by action
 		self.__transition = [dok_matrix((self.num_states, self.num_states)) for _ in range(self.num_actions)]
 
+		# Stacked (state*action x nextState) representation, built on demand and
+		# discarded whenever the transition function is modified
+		self.__matrix = None
+
 
 	def set(self, state, action, next_state, probability):
 		"""
 		Set the probability of the transition provided.
+
+		Multiple transitions can be set simulataneously by passing arrays for the
+		state, action, next_state, and (optionally) probability arguments.
 		"""
 
-		self.__transition[action][state, next_state] = probability
+		if np.ndim(state) == 0:
+			self.__transition[action][state, next_state] = probability
+		else:
+			state = np.asarray(state)
+			action = np.asarray(action)
+			next_state = np.asarray(next_state)
+			probability = np.broadcast_to(probability, state.shape)
+
+			# Group the transitions by action, and set each action's entries at once
+			for a in np.unique(action):
+				mask = action == a
+				self.__transition[a][state[mask], next_state[mask]] = probability[mask]
+
+		self.__matrix = None
 
 
 	def __call__(self, state, action, next_state):
@@ -217,6 +247,7 @@ class SparseTransition(AbstractTransition):
 		state,action,nextState = index
 
 		self.__transition[action][state,nextState] = value
+		self.__matrix = None
 
 
 	def sample(self, state, action, shape = None):
@@ -259,3 +290,27 @@ class SparseTransition(AbstractTransition):
 		"""
 
 		return self.__transition
+
+
+	def asMatrix(self):
+		"""
+		Return a sparse CSR matrix of the transition function, with shape
+		(num_states*num_actions x num_states).  Row state*num_actions + action
+		contains the distribution over next states for the state / action pair,
+		so that a single product with V gives the expected next state value of
+		every state / action pair.
+		"""
+
+		if self.__matrix is None:
+			rows, cols, data = [], [], []
+
+			for action, m in enumerate(self.__transition):
+				m = m.tocoo()
+				rows.append(m.row * self.num_actions + action)
+				cols.append(m.col)
+				data.append(m.data)
+
+			self.__matrix = coo_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+			                           shape=(self.num_states*self.num_actions, self.num_states)).tocsr()
+
+		return self.__matrix
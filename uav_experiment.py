@@ -8,9 +8,14 @@ from utils import Logger, GridworldVisualizer, GridworldValueVisualizer, AgentVi
 from world_config_20x20 import *
 #from world_config_6x6 import *
 import random
-import copy
 import os
 import sys
+from multiprocessing import Pool
+
+try:
+	import numba
+except ImportError:
+	numba = None
 
 def createTasks(stateSpace, num_task_types):
 	"""
@@ -18,11 +23,11 @@ def createTasks(stateSpace, num_task_types):
 
 	tasks = Tasks(stateSpace, num_task_types)
 
-	for i in range(NUM_TASKS):
-		task_num = np.random.randint(0,NUM_TASK_TYPES)
-		state = random.choice([s for s in stateSpace])
-		while tasks.get(state) is not None:
-			state = random.choice([s for s in stateSpace])
+	# Pick distinct states for the tasks, and a random type for each task
+	states = random.sample(list(stateSpace), NUM_TASKS)
+	task_nums = np.random.randint(0, NUM_TASK_TYPES, size=NUM_TASKS)
+
+	for state, task_num in zip(states, task_nums):
 		tasks.add(state, task_num)
 
 	return tasks
@@ -185,7 +190,13 @@ class UAV:
 		return detected_tasks
 
 
-def run(log_path, visualize):
+def run(log_path, visualize, seed=None):
+	# Seed the random number generators, so that runs are reproducible and
+	# independent of each other
+	if seed is not None:
+		np.random.seed(seed)
+		random.seed(seed)
+
 	#### Create the environment #####
 	world = NoisyGridworld((WIDTH,HEIGHT), blocked=blocked, noise = NOISE, TransitionClass=SparseTransition)
 	taskWorld = TaskWorld(world)
@@ -275,7 +286,8 @@ def run(log_path, visualize):
 	            	       'beta': BETA,
 	                	   'discount': DISCOUNT,
 		                   'blocked': blocked,
-		                   'detector': DETECTOR})
+		                   'detector': DETECTOR},
+		         num_steps=NUM_STEPS)
 
 	# Get the world state
 	state = world.current_state
@@ -299,9 +311,10 @@ def run(log_path, visualize):
 		# Update the logger time
 		log.setTime(t)
 
-		# Update the reward parameter
-
-		reward.setParameters(rewardParameters[t])
+		# Update the reward parameter, if it has changed, so the reward is only
+		# recalculated when needed
+		if not np.array_equal(reward.parameters, rewardParameters[t]):
+			reward.setParameters(rewardParameters[t])
 		if visualize:	
 			rewardParamVisualizer.add(t, rewardParameters[t])
 
@@ -311,8 +324,8 @@ def run(log_path, visualize):
 		# Recalculate the policy
 		policy = solver.solve()
 
-		log.log('V', solver.V.copy())
-		log.log('Q', solver.Q.copy())
+		log.log('V', solver.V)
+		log.log('Q', solver.Q)
 
 		# Determine the action
 		action = policy.selectAction(state)
@@ -342,7 +355,7 @@ def run(log_path, visualize):
 		# Check if a task has been done 
 		if tasks.get(state) is not None:
 			onlineIRL.observe(trajectory)
-			prev_trajectory = copy.deepcopy(trajectory)
+			prev_trajectory = trajectory.copy()
 			trajectory = []
 			updateIRL = True
 			log.log('task_performed', (state, tasks.get(state)))
@@ -351,7 +364,7 @@ def run(log_path, visualize):
 
 		if len(trajectory) >= MAX_IRL_STEPS:
 			onlineIRL.observe(trajectory)
-			prev_trajectory = copy.deepcopy(trajectory)
+			prev_trajectory = trajectory.copy()
 			trajectory = []
 			updateIRL = True
 
@@ -371,7 +384,7 @@ def run(log_path, visualize):
 			# Update the onlineIRL so it's state representation isn't stale
 			if len(trajectory) > 0:
 				onlineIRL.observe(trajectory)
-				prev_trajectory = copy.deepcopy(trajectory)
+				prev_trajectory = trajectory.copy()
 				trajectory = []
 				updateIRL = True
 
@@ -402,14 +415,14 @@ def run(log_path, visualize):
 			staleVisualizer.updateGrid(uav.steps_since_observed)		
 
 		if updateIRL:
-			log.log('reward_pseudoestimate', onlineIRL.pseudoestimate.copy())
-			log.log('reward_pseudovariance', onlineIRL.pseudovariance.copy())
-			log.log('reward_estimate_update', onlineIRL.meanReward.copy())
-			log.log('reward_variance_update', onlineIRL.varReward.copy())
-			log.log('onlineIRL_mu', onlineIRL.mu.copy())
-			log.log('onlineIRL_nu', onlineIRL.nu.copy())
-			log.log('onlineIRL_alpha', onlineIRL.alpha.copy())
-			log.log('onlineIRL_beta', onlineIRL.beta.copy())
+			log.log('reward_pseudoestimate', onlineIRL.pseudoestimate)
+			log.log('reward_pseudovariance', onlineIRL.pseudovariance)
+			log.log('reward_estimate_update', onlineIRL.meanReward)
+			log.log('reward_variance_update', onlineIRL.varReward)
+			log.log('onlineIRL_mu', onlineIRL.mu)
+			log.log('onlineIRL_nu', onlineIRL.nu)
+			log.log('onlineIRL_alpha', onlineIRL.alpha)
+			log.log('onlineIRL_beta', onlineIRL.beta)
 			log.log('onlineIRL_KL', onlineIRL.divergence)
 
 			onlineIrlReward.setParameters(onlineIRL.meanReward)
@@ -417,11 +430,11 @@ def run(log_path, visualize):
 			onlineIrlPolicy = onlineIrlSolver.solve()
 
 			log.log('psuedo_Likelihood', irlPolicy.likelihood(prev_trajectory))
-			log.log('pseudo_V', irlSolver.V.copy())
-			log.log('pseudo_Q', irlSolver.Q.copy())
+			log.log('pseudo_V', irlSolver.V)
+			log.log('pseudo_Q', irlSolver.Q)
 			log.log('onlineIRL_likelihood', onlineIrlPolicy.likelihood(prev_trajectory))
-			log.log('onlineIRL_V', onlineIrlSolver.V.copy())
-			log.log('onlineIrl_Q', onlineIrlSolver.Q.copy())
+			log.log('onlineIRL_V', onlineIrlSolver.V)
+			log.log('onlineIrl_Q', onlineIrlSolver.Q)
 
 			log.log('task_detection_probabilities', uav.detector(onlineIRL.meanReward))
 
@@ -432,7 +445,7 @@ def run(log_path, visualize):
 
 			if onlineIRL.divergence >= NEW_INTENT_THRESHOLD and t >= new_intent_time:
 				new_intent_time = t + MIN_NUMBER_STEPS_NEW_INTENT
-				log.log('final_intent_reward_parameters', onlineIRL.meanReward.copy())
+				log.log('final_intent_reward_parameters', onlineIRL.meanReward)
 				onlineIRL.init_hyperparameters()
 				log.log('new_intent', True)
 
@@ -445,6 +458,16 @@ def run(log_path, visualize):
 #		vis.close()
 
 
+def initWorker():
+	"""
+	Limit each worker process to a single Numba thread, as the runs are
+	already performed in parallel across processes
+	"""
+
+	if numba is not None:
+		numba.set_num_threads(1)
+
+
 if __name__ == '__main__':
 	
 	path = sys.argv[1]
@@ -458,6 +481,18 @@ if __name__ == '__main__':
 	if not os.path.exists(path):
 		os.makedirs(path)
 	path_template = path + "run_%d.pkl"
-	for run_num in range(start_num, end_num):
-		print("Experiment %d" % run_num)
-		run(path_template % run_num, visualize) 
+	# Runs are independent, so run them in parallel.  Visualization uses
+	# matplotlib, which can't be shared across processes, so visualized runs
+	# are performed sequentially
+	if visualize:
+		for run_num in range(start_num, end_num):
+			print("Experiment %d" % run_num)
+			run(path_template % run_num, visualize, run_num)
+	else:
+		with Pool(processes=os.cpu_count(), initializer=initWorker) as pool:
+			results = [(run_num, pool.apply_async(run, (path_template % run_num, False, run_num)))
+			           for run_num in range(start_num, end_num)]
+
+			for run_num, result in results:
+				result.get()
+				print("Experiment %d" % run_num)
@@ -1,3 +1,5 @@
+import numpy as np
+
 try:
 	import cPickle as pickle
 except:
@@ -7,18 +9,24 @@ class Logger:
 	"""
 	"""
 
-	def __init__(self, path, metadata):
+	def __init__(self, path, metadata, num_steps=None):
 		"""
 		path      - the path to store data to
 		metadata  - a dictionary of static information about the experiment
-		data_keys - a list of keys to store data to at each time step
+		num_steps - (optional) the number of time steps in the experiment.  If
+		            provided, numpy values are copied into a buffer preallocated
+		            for all time steps, rather than stored as separate arrays
 		"""
 
 		self.path = path
 		self.metadata = metadata
+		self.num_steps = num_steps
 		self.data = {}
 		self.time = 0
 
+		# Preallocated buffers, mapping key -> (array, set of logged times)
+		self.buffers = {}
+
 
 	def setTime(self, time):
 		"""
@@ -30,8 +38,40 @@ class Logger:
 			self.data[self.time] = {}
 
 
+	def __buffer(self, key, value):
+		"""
+		Return the preallocated buffer for the key, creating it from the first
+		value logged, or None if the value can't be stored in the buffer
+		"""
+
+		if self.num_steps is None or not 0 <= self.time < self.num_steps:
+			return None
+
+		# Only numeric values are buffered; strings and objects would be
+		# truncated or cast to fit the buffer
+		if not isinstance(value, (np.ndarray, np.generic)) or value.dtype.kind not in 'biufc':
+			return None
+
+		if not key in self.buffers:
+			self.buffers[key] = (np.empty((self.num_steps,) + np.shape(value), dtype=value.dtype), set())
+
+		buffer, _ = self.buffers[key]
+
+		# Values which don't exactly match the buffer's shape and dtype are stored
+		# separately, rather than cast to fit it
+		if np.shape(value) != buffer.shape[1:] or value.dtype != buffer.dtype:
+			return None
+
+		return self.buffers[key]
+
+
 	def log(self, key, value):
 		"""
+		Log the value of the key at the current time.  Numeric numpy values with
+		exactly the shape and dtype of the key's preallocated buffer are copied
+		into it; any other numpy array is copied as is, rather than cast to fit
+		the buffer.  Values are therefore stored exactly, and callers don't need
+		to copy arrays which may later be modified in place.
 		"""
 
 		# Create a dictionary for the current time if it doesn't
@@ -39,8 +79,22 @@ class Logger:
 		if not self.time in self.data:
 			self.data[self.time] = {}
 
+		buffer = self.__buffer(key, value)
+
 		# Store the value, overwriting any prior results
-		self.data[self.time][key] = value
+		if buffer is not None:
+			np.copyto(buffer[0][self.time, ...], value)
+			buffer[1].add(self.time)
+		else:
+			# Copy numpy arrays which don't match the buffer, so later in-place
+			# changes by the caller don't modify the logged value
+			if isinstance(value, np.ndarray):
+				value = np.array(value)
+
+			self.data[self.time][key] = value
+
+			if key in self.buffers:
+				self.buffers[key][1].discard(self.time)
 
 
 	def save(self):
@@ -48,7 +102,12 @@ class Logger:
 		Store the data using pickle
 		"""
 
+		# Move buffered values into the per-time data
+		for key, (buffer, times) in self.buffers.items():
+			for t in times:
+				self.data[t][key] = buffer[t]
+
 		log = {'metadata': self.metadata, 'data': self.data}
 
 		with open(self.path, 'wb') as pf:
-			pickle.dump(log, pf)
\ No newline at end of file
+			pickle.dump(log, pf)